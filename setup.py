@@ -11,20 +11,96 @@ $ pip install wheel
 """
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import ast
+import hashlib
 import os
+import pickle
 import re
+import subprocess
 import sys
+import tempfile
+import textwrap
 from pathlib import Path
 from shutil import rmtree
-from typing import Any, Dict, Final, List, Optional, Union
+from typing import Any, Callable, Dict, Final, FrozenSet, List, Optional
 
 import yaml
-from setuptools import Command, find_packages, setup
+from setuptools import Command, setup
+
+try:
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeLoader as YamlLoader
 
 here = Path(__file__).parent
 
+# Sections of the README left out of the docstring.
+_SKIP_HEADS: FrozenSet[str] = frozenset({"Installation", "Requirements", "History"})
+
+# Pattern of the version tuple in __version__.py.
+_VERSION_RE = re.compile(r"^VERSION\s*=\s*(\(.*?\))", re.MULTILINE)
+
+# Set SETUP_NO_CACHE to a non-empty value to bypass the on-disk caches.
+USE_CACHE = not os.environ.get("SETUP_NO_CACHE")
+
+
+def cached_load(data: bytes, loader: Callable[[bytes], Any], cache_dir: Path) -> Any:
+    """
+    Loads some data through the loader, caching the result on the disk. The
+    cache is keyed on the data and the contents of this script, so editing
+    either of them invalidates it naturally.
+
+    Parameters
+    ----------
+    data : bytes
+        Contents of the file to be loaded.
+    loader : Callable[[bytes], Any]
+        Called with `data` when the cache misses; its return value must be
+        picklable.
+    cache_dir : Path
+        Directory where the cached results are stored.
+
+    Returns
+    -------
+    Any
+        The value returned by the loader.
+
+    """
+    if not USE_CACHE:
+        return loader(data)
+    key = hashlib.blake2b(Path(__file__).read_bytes(), digest_size=16)
+    key.update(data)
+    cache = cache_dir / f"{key.hexdigest()}.pkl"
+    try:
+        return pickle.loads(cache.read_bytes())
+    except Exception:  # pylint: disable=broad-except
+        # A corrupted pickle can fail in many ways; just load the data again.
+        pass
+    result = loader(data)
+    try:
+        cache_dir.mkdir(exist_ok=True)
+        # Entries with other keys are stale, so drop them before adding this one.
+        for x in cache_dir.glob("*.pkl"):
+            x.unlink(missing_ok=True)
+        # Write to a temporary file first, so that an interrupted or concurrent
+        # build never leaves a partly written entry behind.
+        tmp = cache_dir / f"{cache.stem}.{os.getpid()}.tmp"
+        try:
+            tmp.write_bytes(pickle.dumps(result))
+            os.replace(tmp, cache)
+        finally:
+            tmp.unlink(missing_ok=True)
+    except OSError:
+        pass
+    return result
+
+
 # Load the package's meta-data from metadata.yml.
-yml: Dict[str, Any] = yaml.safe_load((here / "metadata.yml").read_text())
+yml: Dict[str, Any] = cached_load(
+    (here / "metadata.yml").read_bytes(),
+    lambda x: yaml.load(x, Loader=YamlLoader),
+    here / ".meta_cache",
+)
 NAME: Final[str] = yml["NAME"]
 VERSION: Final[Optional[str]] = yml["VERSION"]
 SUMMARY: Final[str] = yml["SUMMARY"]
@@ -38,19 +114,27 @@ PACKAGE_DIR = "src"
 
 # Import the README and use it as the long-description.
 try:
-    long_description = "\n" + (here / "README.md").read_text()
+    readme: Optional[bytes] = (here / "README.md").read_bytes()
+    long_description = "\n" + readme.decode("utf-8")
 except FileNotFoundError:
+    readme = None
     long_description = SUMMARY
 
 
-# Load the package's __version__.py module as a dictionary.
+# Read the package's version from __version__.py without executing it.
 about = {}
-python_exec = exec
 if not VERSION:
     try:
-        python_exec((here / PACKAGE_DIR / "__version__.py").read_text(), about)
+        version_file = (here / PACKAGE_DIR / "__version__.py").read_bytes()
     except FileNotFoundError:
         about["__version__"] = "0.0.0"
+    else:
+        if not (m := _VERSION_RE.search(version_file.decode("utf-8"))):
+            raise ValueError(
+                "expected a one-line tuple literal `VERSION = (...)` in __version__.py"
+            )
+        # Must stay in sync with how __version__.py builds `__version__`.
+        about["__version__"] = ".".join(map(str, ast.literal_eval(m.group(1))))
 else:
     about["__version__"] = VERSION
 
@@ -74,79 +158,83 @@ class UploadCommand(Command):
 
     def run(self):
         """Run commands."""
-        try:
-            self.status("Removing previous builds…")
-            rmtree(os.path.join(here, "dist"))
-        except OSError:
-            pass
+        self.status("Removing previous builds…")
+        rmtree(here / "dist", ignore_errors=True)
 
         self.status("Building Source and Wheel (universal) distribution…")
-        os.system(f"{sys.executable} setup.py sdist bdist_wheel --universal")
+        with tempfile.TemporaryDirectory() as egg_base:
+            # Build both at the same time; the wheel writes its egg-info elsewhere
+            # so that the two builds never touch the same files.
+            builds = [
+                subprocess.Popen([sys.executable, "setup.py", "sdist"]),
+                subprocess.Popen(
+                    [sys.executable, "setup.py", "egg_info", "--egg-base", egg_base]
+                    + ["bdist_wheel", "--universal"]
+                ),
+            ]
+            for build in builds:
+                build.wait()
+        for build in builds:
+            if build.returncode:
+                raise subprocess.CalledProcessError(build.returncode, build.args)
 
         self.status("Uploading the package to PyPI via Twine…")
-        os.system("twine upload dist/*")
+        dists = [str(x) for x in (here / "dist").iterdir() if x.is_file()]
+        subprocess.run(["twine", "upload", *dists], check=True)
 
         self.status("Pushing git tags…")
-        os.system(f"git tag v{about['__version__']}")
-        os.system("git push --tags")
+        subprocess.run(["git", "tag", f"v{about['__version__']}"], check=True)
+        subprocess.run(["git", "push", "--tags"], check=True)
 
         sys.exit()
 
 
-def rsplit(
-    pattern: Union[str, re.Pattern],
-    string: str,
-    maxsplit: int = 0,
-    flags: Union[int, re.RegexFlag] = 0,
-) -> List[str]:
+def list_packages(root: Path, name: str) -> List[str]:
     """
-    Split the string by the occurrences of the pattern. Differences to
-    `re.split()` that all groups in the pattern are also returned, each
-    connected with the substring on its right.
+    Finds the packages under the source directory, naming them after the
+    installed package instead of the directory. Like setuptools, it does not
+    descend into directories that are not packages themselves.
 
     Parameters
     ----------
-    pattern : Union[str, re.Pattern]
-        Pattern string.
-    string : str
-        String to be splitted.
-    maxsplit : int, optional
-        Max number of splits, if specified to be 0, there will be no
-        more limits, by default 0.
-    flags : Union[int, re.RegexFlag], optional
-        Regex flag, by default 0.
+    root : Path
+        The source directory, which is installed as the top-level package.
+    name : str
+        Name of the top-level package.
 
     Returns
     -------
     List[str]
-        List of substrings.
+        Dotted names of the packages found.
+
+    """
+    packages: List[str] = []
+    stack = [(root, name)]
+    while stack:
+        path, package = stack.pop()
+        if not (path / "__init__.py").is_file():
+            continue
+        packages.append(package)
+        with os.scandir(path) as it:
+            for entry in it:
+                if entry.is_dir() and "." not in entry.name:
+                    stack.append((Path(entry.path), f"{package}.{entry.name}"))
+    return packages
+
+
+class SpaceWrapper(textwrap.TextWrapper):
+    """
+    Text wrapper that breaks lines at spaces only. Other whitespace, such as
+    tabs, stays inside the words, except that whitespace following a space
+    belongs to the break.
 
     """
-    splits: List[str] = []
-    searched = re.search(pattern, string, flags=flags)
-    left: str = ""
-    while searched:
-        span = searched.span()
-        splits.append(left + string[: span[0]])
-        left = searched.group()
-        string = string[span[1] :]
-        if len(splits) >= maxsplit > 0:
-            break
-        searched = re.search(pattern, string, flags=flags)
-    splits.append(left + string)
-    return splits
-
-
-def __maxsplit(string: str, maximum: int = 1):
-    head, tail = string, ""
-    if len(string) > maximum:
-        if (i := string.rfind(" ", None, 1 + maximum)) > 0 and (
-            l := string[:i]
-        ).strip():
-            head, tail = l, string[1 + i :]
-        elif (j := string.find(" ", 1 + maximum)) > 0:
-            head, tail = string[:j], string[1 + j :]
-    return head.rstrip(), tail.strip()
+
+    wordsep_simple_re = re.compile(r"( +\s*)")
+
+
+# Text wrappers used by word_wrap(), keyed on the maximum line length.
+_WRAPPERS: Dict[int, SpaceWrapper] = {}
 
 
 def word_wrap(string: str, maximum: int = 100) -> str:
@@ -170,16 +258,54 @@ def word_wrap(string: str, maximum: int = 100) -> str:
     """
     if maximum < 1:
         raise ValueError(f"expected maximum > 0, got {maximum} instead")
+    if (wrapper := _WRAPPERS.get(maximum)) is None:
+        wrapper = _WRAPPERS[maximum] = SpaceWrapper(
+            maximum,
+            expand_tabs=False,
+            replace_whitespace=False,
+            break_long_words=False,
+            break_on_hyphens=False,
+        )
     lines: List[str] = []
     for x in string.splitlines():
-        while True:
-            l, x = __maxsplit(x, maximum=maximum)
-            lines.append(l)
-            if not x:
-                break
+        # Keep the indent on the first line, even if the first word does not fit;
+        # an indent with spaces beyond the maximum is broken off as an empty line.
+        body = x.lstrip()
+        indent, body = x[: len(x) - len(body)], body.rstrip()
+        if body and " " in indent[maximum + 1 :]:
+            lines.append("")
+            indent = ""
+        wrapper.initial_indent = indent
+        lines.extend([l.rstrip() for l in wrapper.wrap(body)] or [""])
     return "\n".join(lines)
 
 
+def strip_block(string: str, start: str, end: str) -> str:
+    """
+    Removes the block that begins with the first occurrence of `start` and
+    finishes with the last occurrence of `end`. The string is returned as
+    it is if no such block is found.
+
+    Parameters
+    ----------
+    string : str
+        The input string.
+    start : str
+        Opening delimiter of the block.
+    end : str
+        Closing delimiter of the block.
+
+    Returns
+    -------
+    str
+        The string with the block removed.
+
+    """
+    if (i := string.find(start)) < 0 or (j := string.rfind(end)) < i + len(start):
+        return string
+    return string[:i] + string[j + len(end) :]
+
+
 def readme2doc(readme: str) -> str:
     """
     Takes a readme string as input and returns a modified version of the
@@ -196,37 +322,70 @@ def readme2doc(readme: str) -> str:
         A modified version of the readme string.
 
     """
-    doc = ""
-    for i in rsplit("\n## ", readme):
-        head = re.search(" .*\n", i).group()[1:-1]
-        if head not in {"Installation", "Requirements", "History"}:
-            doc += i
-    doc = re.sub("<!--html-->.*<!--/html-->", "", doc, flags=re.DOTALL)
+    parts: List[str] = []
+    for n, i in enumerate(readme.split("\n## ")):
+        if n:
+            i = "\n## " + i
+        # The head runs from the first space to the end of that line.
+        sp = i.find(" ") + 1
+        if (nl := i.find("\n", sp)) < 0:
+            nl = len(i)
+        head = i[sp:nl]
+        if head not in _SKIP_HEADS:
+            parts.append(i)
+    doc = strip_block("".join(parts), "<!--html-->", "<!--/html-->")
     return word_wrap(doc) + "\n\n"
 
 
+def strip_docstring(source: str) -> str:
+    """
+    Removes the leading triple-quoted docstring from the source code of a
+    module. The source is returned as it is if it does not start with one.
+
+    Parameters
+    ----------
+    source : str
+        Source code of the module.
+
+    Returns
+    -------
+    str
+        The source code following the docstring.
+
+    """
+    if source.startswith(('"""', "'''")):
+        if (end := source.find(source[:3], 3)) >= 0:
+            return source[end + 3 :]
+    return source
+
+
 class ReadmeFormatError(Exception):
     """Raised when the README has a wrong format."""
 
 
 if __name__ == "__main__":
     # Import the __init__.py and change the module docstring.
-    try:
-        init_path = here / PACKAGE_DIR / "__init__.py"
-        module_file = init_path.read_text()
-        new_doc = readme2doc(long_description)  # pylint: disable=invalid-name
-        if "'''" in new_doc and '"""' in new_doc:
-            raise ReadmeFormatError("Both \"\"\" and ''' are found in the README")
-        if '"""' in new_doc:
-            new_doc = f"'''{new_doc}'''"
-        else:
-            new_doc = f'"""{new_doc}"""'
-        module_file = re.sub(
-            "^\"\"\".*\"\"\"|^'''.*'''|^", new_doc, module_file, flags=re.DOTALL
-        )
-        init_path.write_text(module_file)
-    except FileNotFoundError:
-        pass
+    if readme is not None:
+        try:
+            init_path = here / PACKAGE_DIR / "__init__.py"
+            module_file = init_path.read_bytes().decode("utf-8")
+            new_doc = cached_load(  # pylint: disable=invalid-name
+                readme,
+                lambda _: readme2doc(long_description),
+                here / ".readme_cache",
+            )
+            if "'''" in new_doc and '"""' in new_doc:
+                raise ReadmeFormatError("Both \"\"\" and ''' are found in the README")
+            if '"""' in new_doc:
+                new_doc = f"'''{new_doc}'''"
+            else:
+                new_doc = f'"""{new_doc}"""'
+            new_file = new_doc + strip_docstring(module_file)
+            # Leave the file untouched if nothing changed, so that its mtime is kept.
+            if new_file != module_file:
+                init_path.write_bytes(new_file.encode("utf-8"))
+        except FileNotFoundError:
+            pass
 
     # Where the magic happens.
     setup(
@@ -239,9 +398,7 @@ if __name__ == "__main__":
         author_email=AUTHOR_EMAIL,
         python_requires=REQUIRES_PYTHON,
         url=HOMEPAGE,
-        packages=[
-            x.replace(PACKAGE_DIR, NAME) for x in find_packages(exclude=["examples"])
-        ],
+        packages=list_packages(here / PACKAGE_DIR, NAME),
         package_dir={NAME: PACKAGE_DIR},
         install_requires=REQUIRES,
         extras_require=EXTRAS,
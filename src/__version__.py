@@ -1,4 +1,6 @@
 """Version file."""
 VERSION = (0, 0, 16)
 
+# setup.py reads VERSION as a one-line tuple literal and joins it the same way;
+# keep the two in sync.
 __version__ = ".".join(map(str, VERSION))
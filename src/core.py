@@ -5,14 +5,19 @@ NOTE: this module is private. All functions and objects are available in the mai
 `lazyr` namespace - use that instead.
 
 """
+# pylint: disable=unidiomatic-typecheck
+from __future__ import annotations
+
 import importlib
-import inspect
-import logging
+import itertools
 import sys
-from typing import TYPE_CHECKING, Any, List, Literal, Optional, Set, Union
 
+# Same as typing.TYPE_CHECKING, without importing typing at runtime.
+TYPE_CHECKING = False
 if TYPE_CHECKING:
+    import logging
     from types import ModuleType
+    from typing import Any, Dict, List, Literal, Optional, Set, Union
 
 __all__ = ["register", "wakeup", "islazy", "LazyModule"]
 
@@ -22,7 +27,7 @@ def register(
     package: Optional[str] = None,
     ignore: Optional[List[str]] = None,
     verbose: Literal[0, 1, 2, 3] = 0,
-) -> "ModuleType":
+) -> ModuleType:
     """
     Register a module as a lazy one. A lazy module is not physically loaded in the
     Python environment until its attributes are being accessed, or compulsively
@@ -60,27 +65,31 @@ def register(
         Raised if not a relative import when the `package` argument is provided.
 
     """
-    if (module_name := __join_module_name(name, package=package)) not in sys.modules:
-        sys.modules[module_name] = LazyModule(
-            module_name, ignore=ignore, verbose=verbose
-        )
-    elif isinstance(m := sys.modules[module_name], LazyModule):
-        getattr(m, "_LazyModule__ignore")(ignore)
-    return sys.modules[module_name]
-
-
-def __join_module_name(name: str, package: Optional[str] = None):
+    modules = sys.modules
     if package is None:
-        return name
-    if not name.startswith("."):
+        if (m := modules.get(name)) is not None and type(m) is not LazyModule:
+            return m
+        module_name = name
+    elif name.startswith("."):
+        module_name = package + name
+    else:
         raise TypeError(
             f"expected a relative import when the `package` argument is provided, \
 got '{name}' instead"
         )
-    return package + name
-
-
-def wakeup(module: "ModuleType"):
+    name, attrs = module_name, ignore
+    while name:
+        if name in modules:
+            if type(m := modules[name]) is LazyModule:
+                m._LazyModule__ignore(attrs)  # pylint: disable=protected-access
+            break
+        modules[name] = LazyModule(name, ignore=attrs, verbose=verbose)
+        name, _, suffix = name.rpartition(".")
+        attrs = [suffix]
+    return modules[module_name]
+
+
+def wakeup(module: ModuleType):
     """
     Compulsively activates a lazy module by loading it as a normal one.
 
@@ -90,11 +99,11 @@ def wakeup(module: "ModuleType"):
         The module to be activated.
 
     """
-    if isinstance(module, LazyModule):
-        getattr(module, "_LazyModule__wakeup")()
+    if type(module) is LazyModule:
+        module._LazyModule__wakeup()  # pylint: disable=protected-access
 
 
-def islazy(module: Union["ModuleType", str]) -> bool:
+def islazy(module: Union[ModuleType, str]) -> bool:
     """
     Checks if a module is lazy or not. Returns False if received a `LazyModule`
     object that has not been activated yet, otherwise returns True. If only to
@@ -121,22 +130,67 @@ def islazy(module: Union["ModuleType", str]) -> bool:
         if module not in sys.modules:
             raise ModuleNotFoundError(f"no module named '{module}'")
         module = sys.modules[module]
-    if isinstance(module, LazyModule):
-        return not bool(getattr(module, "_LazyModule__module"))
+    if type(module) is LazyModule:
+        return not module._LazyModule__module  # pylint: disable=protected-access
     return False
 
 
+_logger: Optional[logging.Logger] = None
+
+# Values of logging.DEBUG and logging.INFO, known without importing logging.
+_DEBUG, _INFO = 10, 20
+
+
+def _get_logger() -> logging.Logger:
+    global _logger  # pylint: disable=global-statement
+    if _logger is None:
+        import logging  # pylint: disable=import-outside-toplevel
+
+        logger = logging.getLogger("lazyr")
+        logger.propagate = False
+        if not logger.hasHandlers():
+            logger.setLevel(logging.DEBUG)
+            sh = logging.StreamHandler()
+            fm = logging.Formatter("%(levelname)s:%(name)s:%(message)s")
+            sh.setFormatter(fm)
+            logger.addHandler(sh)
+        _logger = logger
+    return _logger
+
+
+# Cache of the attributes that should not wake up a lazy module, mapped to whether
+# the import system may still need them. It starts with __spec__ and __path__, and
+# grows at runtime: names starting with one of the skipped prefixes are added the
+# first time they are accessed. The import system reads a parent package's
+# __path__ before its __spec__, so only __path__ needs checking.
+_skipped_attrs: Dict[str, bool] = {"__spec__": False, "__path__": True}
+_SKIPPED_PREFIXES = ("_ipython_", "_repr_")
+
+
 class LazyModule:
     """
     An implementation of a lazy module.
 
     Note that this should NEVER be instantiated directly, but always through the
-    module-level function `lazyr.register()`.
+    module-level function `lazyr.register()`. It is not designed to be subclassed
+    either: lazy modules are recognized by an exact type check.
+
+    Attributes set on a lazy module are moved onto the real module when it is
+    loaded, and those set or deleted afterwards go straight to the real module.
 
     """
 
-    __skipped_attrs = {"__spec__", "__path__"}
-    __skipped_startswith = ("_ipython_", "_repr_")
+    __slots__ = (
+        "__name",
+        "__name_dot",
+        "__family",
+        "__ignored_attrs",
+        "__verbose",
+        "__module",
+        "__logger",
+        "__dict__",
+        "__weakref__",
+    )
 
     def __init__(
         self,
@@ -145,15 +199,16 @@ class LazyModule:
         verbose: Literal[0, 1, 2, 3] = 0,
     ) -> None:
         self.__name = name
-        self.__ignored_attrs: Set[str] = set()
+        self.__name_dot = name + "."
+        self.__family = tuple(
+            itertools.accumulate(name.split("."), lambda x, y: f"{x}.{y}")
+        )
+        self.__ignored_attrs: Optional[Set[str]] = None
         self.__ignore(ignore)
         self.__verbose = verbose
         self.__module: Optional[ModuleType] = None
         self.__logger = self.__logger_init()
 
-        if p := self.__get_parent():
-            register(p, ignore=[self.__get_suffix()], verbose=verbose)
-
     def __repr__(self):
         if self.__module:
             return repr(self.__module)
@@ -165,62 +220,90 @@ class LazyModule:
 
     def __getattr__(self, __name: str) -> Any:
         self.__debug_access(__name)
-        if not self.__module:
-            if __name in self.__skipped_attrs:
-                if not sys._getframe(1).f_code.co_name == "_find_and_load_unlocked":
+        if (module := self.__module) is None:
+            if (for_import := _skipped_attrs.get(__name)) is None:
+                if __name[:1] == "_" and __name.startswith(_SKIPPED_PREFIXES):
+                    for_import = _skipped_attrs[__name] = False
+            if for_import is not None:
+                if (
+                    not for_import
+                    or sys._getframe(1).f_code.co_name != "_find_and_load_unlocked"
+                ):
                     return None
-            elif __name.startswith(self.__skipped_startswith):
-                return None
-            elif __name in self.__ignored_attrs:
-                if (module_name := f"{self.__name}.{__name}") in sys.modules:
+            if self.__ignored_attrs is not None and __name in self.__ignored_attrs:
+                if (module_name := self.__name_dot + __name) in sys.modules:
                     return sys.modules[module_name]
                 return None
             self.__wakeup(__name)
-        return getattr(self.__module, __name)
+            module = self.__module
+        return getattr(module, __name)
+
+    def __setattr__(self, __name: str, __value: Any) -> None:
+        if __name[:13] == "_LazyModule__" or (module := self.__module) is None:
+            object.__setattr__(self, __name, __value)
+        else:
+            setattr(module, __name, __value)
+
+    def __delattr__(self, __name: str) -> None:
+        if __name[:13] == "_LazyModule__" or (module := self.__module) is None:
+            object.__delattr__(self, __name)
+        else:
+            delattr(module, __name)
 
     def __wakeup(self, __name: Optional[str] = None) -> None:
-        if self.__import_module():
+        if self.__module is None and self.__import_module():
             self.__info_wakeup("__wakeup" if __name is None else __name)
 
     def __ignore(self, ignore: Optional[List[str]] = None) -> None:
-        if ignore is not None:
-            self.__ignored_attrs |= set(ignore)
+        if ignore:
+            if self.__ignored_attrs is None:
+                self.__ignored_attrs = set(ignore)
+            else:
+                self.__ignored_attrs.update(ignore)
 
     def __import_module(self) -> bool:
-        res: bool = False
-        for name in self.__get_family():
-            if isinstance(m := sys.modules[name], self.__class__):
-                del sys.modules[name]
-                module = importlib.import_module(name)
-                if name == self.__name:
-                    res = True
-            else:
-                module = m
+        modules = sys.modules
+        for name in self.__family:
+            # Another thread may be waking up the same family at the same time.
+            if type(modules.get(name)) is LazyModule:
+                modules.pop(name, None)
+        res = self.__name not in modules
+        try:
+            module = importlib.import_module(self.__name)
+        except RuntimeError:
+            # importlib raises a RuntimeError when two threads wait on each other's
+            # imports. Fall back to the partially initialized module then, just
+            # like a circular import in a single thread does.
+            if (module := modules.get(self.__name)) is None:
+                raise
         self.__module = module
+        if (attrs := self.__dict__) and attrs is not module.__dict__:
+            # Move the attributes set before the wakeup onto the real module, where
+            # the later ones go as well. Another thread may have shared the
+            # namespace already, in which case there is nothing to move.
+            module.__dict__.update(attrs)
+            attrs.clear()
+        if self.__verbose < 2:
+            # Share the namespace so that loaded attributes no longer need
+            # to go through __getattr__.
+            object.__setattr__(self, "__dict__", module.__dict__)
         return res
 
-    def __logger_init(self) -> Optional["logging.Logger"]:
+    def __logger_init(self) -> Optional[logging.Logger]:
         if self.__verbose >= 1:
-            logger = logging.getLogger("lazyr")
-            logger.propagate = False
-            if not logger.hasHandlers():
-                logger.setLevel(logging.DEBUG)
-                sh = logging.StreamHandler()
-                fm = logging.Formatter("%(levelname)s:%(name)s:%(message)s")
-                sh.setFormatter(fm)
-                logger.addHandler(sh)
+            logger = _get_logger()
             logger.info("import:%s", self.__name)
             return logger
         return None
 
     def __debug_access(self, __name: str) -> None:
-        if self.__verbose >= 2:
+        if self.__verbose >= 2 and self.__logger.isEnabledFor(_DEBUG):
             self.__logger.debug(
                 "access:%s.%s%s", self.__name, __name, self.__get_frame_info(3)
             )
 
     def __info_wakeup(self, __name: str) -> None:
-        if self.__verbose >= 1:
+        if self.__verbose >= 1 and self.__logger.isEnabledFor(_INFO):
             self.__logger.info(
                 "load:%s(.%s)%s",
                 self.__name,
@@ -231,17 +314,8 @@ class LazyModule:
     def __get_frame_info(self, depth: int) -> str:
         if self.__verbose < 3:
             return ""
-        f = inspect.stack()[depth]
-        return f" ----> {f[1]} --> {f[3]} --> {f[4][0].strip() if isinstance(f[4], list) else None}"
-
-    def __get_family(self) -> List[str]:
-        names: List[str] = [tmp := (splits := self.__name.split("."))[0]]
-        for i in splits[1:]:
-            names.append(tmp := f"{tmp}.{i}")
-        return names
-
-    def __get_parent(self) -> str:
-        return self.__name.rpartition(".")[0]
+        import linecache  # pylint: disable=import-outside-toplevel
 
-    def __get_suffix(self) -> str:
-        return self.__name.rpartition(".")[-1]
+        code, lineno = (f := sys._getframe(depth)).f_code, f.f_lineno
+        line = linecache.getline(code.co_filename, lineno).strip() or None
+        return f" ----> {code.co_filename} --> {code.co_name} --> {line}"